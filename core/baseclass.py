@@ -4,6 +4,7 @@ from core.handlers import RoverHandler
 
 from abc import ABCMeta, abstractmethod
 from configparser import ConfigParser
+from functools import lru_cache
 from time import time
 # from praw import handlers
 from pkg_resources import resource_filename
@@ -39,6 +40,14 @@ class PluginBase(metaclass=ABCMeta):
     :ivar SELF_IGNORE: *Decides if comments from the same username as the plugin are automatically skipped.
     :type SELF_IGNORE: bool
     :vartype SELF_IGNORE: bool
+    :ivar SUBREDDITS: Optional set of subreddit names this plugin cares about. When set, the framework only
+                      routes items from those subreddits here; when left unset the plugin sees the full stream.
+    :type SUBREDDITS: set | None
+    :vartype SUBREDDITS: set | None
+    :ivar HAS_INBOX_HANDLER: Optional flag, defaults to True. Plugins that never act on mail can set it to False
+                             and the framework skips their inbox poll every update cycle.
+    :type HAS_INBOX_HANDLER: bool
+    :vartype HAS_INBOX_HANDLER: bool
     :ivar OA_ACCESS_TOKEN: *Access token for every requests. Gets automatically fetched and refreshed with
                             `oa_refresh(force=False)`
     :type OA_ACCESS_TOKEN: str
@@ -76,32 +85,45 @@ class PluginBase(metaclass=ABCMeta):
     :vartype handler: RedditRoverHandler
     """
 
+    # Compiled once for all plugins; matches 'ban /r/sub' and 'ban /u/user'.
+    RE_BANMSG = re.compile(r'ban /([ru])/([\d\w_]*)', re.UNICODE)
+
+    # Slot-backed attribute access skips the instance __dict__ and an unset attribute fails loudly instead of
+    # lingering as a latent AttributeError. Subclasses without their own __slots__ still get a __dict__, so
+    # plugins are free to add whatever state they need.
+    __slots__ = ('session', 'logger', 'database', 'handler', 'config', '_dispatch', 'BOT_NAME', 'DESCRIPTION',
+                 'IS_LOGGED_IN',
+                 'SELF_IGNORE', 'SUBREDDITS', 'HAS_INBOX_HANDLER', 'USERNAME', 'OA_ACCESS_TOKEN', 'OA_REFRESH_TOKEN', 'OA_APP_KEY', 'OA_APP_SECRET',
+                 'OA_TOKEN_DURATION', 'OA_VALID_UNTIL', '_me')
+
     def __init__(self, database, handler, bot_name, setup_from_config=True):
         self.OA_TOKEN_DURATION = 3540   # Tokens are valid for 60min, this one is it for 59min.
         self.session = None             # Placeholder
         self.logger = self.factory_logger()
         self.database = database
         self.BOT_NAME = bot_name
-        self.RE_BANMSG = re.compile(r'ban /([r|u])/([\d\w_]*)', re.UNICODE)
+        self._me = None                 # caches the logged-in username, see integrity_check
         if not handler:
             self.handler = RoverHandler()
         else:
             self.handler = handler
         if setup_from_config:
             self.config = self.factory_config()
-            get = lambda x: self.config.get(bot_name, x)
-            self.DESCRIPTION = get('description')
-            self.IS_LOGGED_IN = self.config.getboolean(bot_name, 'is_logged_in')
-            options = [option for option, value in self.config.items(bot_name)]
+            # Materialize the plugin's section into a plain dict once instead of going through a
+            # ConfigParser getter (with interpolation machinery) for every single value.
+            section = dict(self.config.items(bot_name))
+            get_bool = lambda x: ConfigParser.BOOLEAN_STATES[section[x].lower()]
+            self.DESCRIPTION = section['description']
+            self.IS_LOGGED_IN = get_bool('is_logged_in')
             check_values = ('app_key', 'app_secret', 'self_ignore', 'username')
             if self.IS_LOGGED_IN:
-                if all(value in options for value in check_values):  # check if important keys are in
-                    self.SELF_IGNORE = self.config.getboolean(bot_name, 'self_ignore')
-                    self.USERNAME = get('username')
-                    self.OA_APP_KEY = get('app_key')
-                    self.OA_APP_SECRET = get('app_secret')
-                    if 'refresh_token' in options:
-                        self.OA_REFRESH_TOKEN = get('refresh_token')
+                if all(value in section for value in check_values):  # check if important keys are in
+                    self.SELF_IGNORE = get_bool('self_ignore')
+                    self.USERNAME = section['username']
+                    self.OA_APP_KEY = section['app_key']
+                    self.OA_APP_SECRET = section['app_secret']
+                    if 'refresh_token' in section:
+                        self.OA_REFRESH_TOKEN = section['refresh_token']
                     else:
                         self._get_keys_manually()
                     self.factory_reddit(True)
@@ -123,9 +145,11 @@ class PluginBase(metaclass=ABCMeta):
             assert hasattr(self, 'USERNAME') and self.USERNAME \
                 and hasattr(self, 'session') and self.session, \
                 "Plugin is declared to be logged in, yet the session info is missing."
-            assert self.session.user.me().name.lower() == self.USERNAME.lower(), \
+            if self._me is None:  # me() is a network round-trip, resolve it once per session
+                self._me = self.session.user.me().name.lower()
+            assert self._me == self.USERNAME.lower(), \
                 "This plugin is logged in with wrong credentials: \n" \
-                "is: {} - should be: {}".format(self.session.user.name, self.USERNAME)
+                "is: {} - should be: {}".format(self._me, self.USERNAME)
         else:
             assert hasattr(self, 'USERNAME') and self.USERNAME is False and \
                 hasattr(self, 'session') and self.session is False, \
@@ -161,9 +185,12 @@ class PluginBase(metaclass=ABCMeta):
             self.session.read_only = True
 
     @staticmethod
+    @lru_cache(maxsize=1)
     def factory_config():
         """
         Sets up a standard config-parser to bot_config.ini. Does not have to be used, but it is handy.
+        The parser is created once per process and shared - every plugin init used to re-read and re-tokenize
+        the same file.
 
         :returns: Set up ConfigParser object, reading `/config/bot_config.ini`.
         :rtype: ConfigParser
@@ -254,10 +281,9 @@ class PluginBase(metaclass=ABCMeta):
             author, human = message.subreddit.display_name.lower(), False
         if not message.was_comment and author in message.body.lower():
             regex_result = self.RE_BANMSG.search(message.body)
-            if regex_result:
-                sub, result = self.RE_BANMSG.search(message.body).groups()
-            else:
+            if not regex_result:
                 return
+            sub, result = regex_result.groups()
             # check if a user wants to ban a user or a sub wants to ban a sub.
             type_consistency = (sub.lower() == 'r' and not human) or (sub.lower() == 'u' and human)
             if author == result.lower() and type_consistency:
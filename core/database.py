@@ -1,10 +1,36 @@
 # coding=utf-8
 import logging
 import sqlite3
-from pkg_resources import resource_filename
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from datetime import datetime
+from importlib.resources import files
 import time
 import atexit
 
+# Callers may hand datetime objects to the timestamp parameters (delete_from_storage and friends); adapt them to
+# the unix-second integers the tables store, instead of sqlite3's default ISO text which would never match.
+sqlite3.register_adapter(datetime, lambda d: int(d.timestamp()))
+
+# Hot-path statements, keyed by a symbolic name. Module-level so every Database instance submits the exact same
+# string objects, which keeps sqlite3's per-connection statement cache hitting instead of re-preparing.
+_SQL = {
+    'check_table': 'SELECT name FROM sqlite_master WHERE  type="table" AND name=(?)',
+    'insert_storage': "INSERT INTO storage VALUES ((?), (?), strftime('%s','now'))",
+    'update_timestamp': """UPDATE update_threads
+                    SET last_updated=strftime('%s','now')
+                    WHERE thing_id=(?)
+                    AND bot_module=(?)""",
+    'retrieve_thing': 'SELECT thing_id, bot_module, timestamp FROM storage '
+                      'WHERE thing_id = (?) AND bot_module = (?) LIMIT 1',
+    'insert_update': 'INSERT INTO update_threads '
+                     '(thing_id, bot_module, created, lifetime, last_updated, interval) '
+                     'VALUES ((?), (?), (?), (?), (?), (?))',
+    'delete_update': "DELETE FROM update_threads WHERE thing_id=(?) AND bot_module = (?) "
+                     "AND strftime('%s','now') > lifetime",
+}
+
 
 class Database:
     """
@@ -23,7 +49,8 @@ class Database:
     :ivar db: A connection to the SQLite database: ``/config/storage.db``
     :type db: sqlite3.Connection
     :vartype db: sqlite3.Connection
-    :ivar cur: Cursor to interface with the database.
+    :ivar cur: Cursor to interface with the database. Lazily created per thread, so the worker threads of the
+               MultiThreader don't stack their result sets on one shared cursor.
     :type cur: sqlite3.Cursor
     :vartype cur: sqlite3.Cursor
     :ivar _meta_push: Dictionary with helper methods to reduce the amount of requests for meta tables
@@ -32,23 +59,160 @@ class Database:
     :ivar _MAX_CACHE = maximum content within the _meta_push dictionary to get pushed into the database.
     :type _MAX_CACHE: int
     :vartype _MAX_CACHE: int
+    :ivar _stmts: The module-level ``_SQL`` statement table - kept as an attribute so callers and tests can reach
+                  the statements through the instance.
+    :type _stmts: dict
+    :vartype _stmts: dict
+    :ivar _module_ids: Maps registered module names onto their rowids, so write paths bind a plain integer instead
+                       of running a sub-select against the modules table on every statement. Shared by all
+                       instances, so a module registered through one instance is visible to the rest.
+    :type _module_ids: dict
+    :vartype _module_ids: dict
     """
 
+    # One connection pair for the whole process: RedditRover builds several Database objects (one per worker
+    # thread plus one per plugin), and every one of them used to open its own file handles and page caches.
+    # The connections are thread-safe here because cursors are thread-local and writes go through _write_lock.
+    _shared_db = None
+    _shared_db_r = None
+    _shared_local = None
+    _shared_write_lock = None
+    _shared_module_ids = None
+    # Bounded LRU over (thing_id, module id) -> storage row, shared like the connections. The streams re-emit
+    # recently handled items all the time, and a hit here answers retrieve_thing without touching sqlite.
+    _shared_seen = None
+    _SEEN_CAP = 4096
+    # Message buffer shared by every instance: plugins append through their own Database object while the
+    # stats renderer reads through another, so a per-instance buffer would hide pending rows from the flush
+    # that iter_all_messages runs before reading.
+    _shared_msg_buffer = None
+    # Bumped on every update-thread registration; RedditRover samples it around plugin calls to learn whether
+    # a call registered fresh update work without polling the table.
+    _update_seq = 0
+    _instances = 0
+
     def __init__(self):
         self.logger = logging.getLogger("database")
-        self.db = sqlite3.connect(
-            resource_filename("config", "storage.db"),
-            check_same_thread=False,
-            isolation_level=None
-        )
-        self.cur = self.db.cursor()
-        self.database_init()
+        self._stmts = _SQL
+        first = Database._shared_db is None
+        if first:
+            Database._shared_db = sqlite3.connect(
+                str(files("config").joinpath("storage.db")),
+                check_same_thread=False,
+                isolation_level=None,
+                cached_statements=256
+            )
+            Database._shared_local = threading.local()
+            Database._shared_write_lock = threading.RLock()
+            Database._shared_seen = OrderedDict()
+            Database._shared_msg_buffer = []
+        self.db = Database._shared_db
+        self._local = Database._shared_local
+        self._write_lock = Database._shared_write_lock
+        if first:
+            try:  # Some filesystems (network mounts for example) refuse WAL, the bot works with the defaults then.
+                mode = self.cur.execute('PRAGMA journal_mode=WAL').fetchone()[0]
+                if mode.lower() != 'wal':
+                    self.logger.warning('Could not switch to WAL journaling (got {}), writes will be slower.'.format(
+                        mode))
+                self.cur.execute('PRAGMA synchronous=NORMAL')
+                self.cur.execute('PRAGMA temp_store=MEMORY')
+                self.cur.execute('PRAGMA cache_size=-64000')
+                self.cur.execute('PRAGMA mmap_size=268435456')
+                self.cur.execute('PRAGMA busy_timeout=3000')
+            except sqlite3.OperationalError:
+                self.logger.warning('Could not tune the database PRAGMAs, running on sqlite defaults.')
+            self.cur.execute('PRAGMA foreign_keys=ON')
+            self.database_init()
+            # Second, read-only connection: under WAL, readers on their own connection don't queue up behind the
+            # writer, so the stats scans can run while ingest keeps committing. Opened after database_init so the
+            # file is guaranteed to exist.
+            Database._shared_db_r = sqlite3.connect(
+                'file:{}?mode=ro'.format(files("config").joinpath("storage.db")),
+                uri=True,
+                check_same_thread=False
+            )
+            self.db_r = Database._shared_db_r
+            try:  # belt and braces on top of mode=ro, plus its own page cache sized for the analytic scans
+                self.rcur.execute('PRAGMA query_only=1')
+                self.rcur.execute('PRAGMA cache_size=-64000')
+                self.rcur.execute('PRAGMA mmap_size=268435456')
+            except sqlite3.OperationalError:
+                self.logger.warning('Could not tune the read-only connection PRAGMAs.')
+            Database._shared_module_ids = {name: rowid for rowid, name in self.get_all_modules()}
+        self.db_r = Database._shared_db_r
+        self._module_ids = Database._shared_module_ids
+        self._seen = Database._shared_seen
+        Database._instances += 1
         self._meta_push = {'submissions': 0, 'comments': 0, 'cycles': 0}
+        self._meta_total = 0
         self._MAX_CACHE = 500
-        self._date = time.time() // (60 * 60)
-        atexit.register(self.write_out_meta_push, force=True)  # When the database gets closed, write out the meta
-        # atexit.register(self.db.close)
-        atexit.register(self.logger.warning, "DB connection has been closed.")
+        self._message_buffer = Database._shared_msg_buffer
+        self._MAX_MSG_BUFFER = 128
+        self._date = int(time.time() // (60 * 60))
+        self._next_rollover = (self._date + 1) * 3600
+        self._last_analyze = time.time() // 86400
+        self._closed = False
+        atexit.register(self.close)  # flushes the meta cache and closes the connection on a clean exit
+
+    def close(self):
+        """
+        Writes out the remaining meta cache and closes the connection. Safe to call more than once - the atexit hook
+        and an explicit ``with``-block both end up here.
+        """
+        if self._closed:
+            return
+        self._closed = True
+        self.write_out_meta_push(force=True)
+        self._flush_messages()
+        Database._instances -= 1
+        if Database._instances > 0:  # the connections stay open for the remaining instances
+            return
+        try:  # refreshes planner statistics for whatever changed this session, cheap by design
+            with self._write_lock:
+                self.cur.execute('PRAGMA optimize')
+        except sqlite3.Error:
+            pass
+        self.db_r.close()
+        self.db.close()
+        Database._shared_db = None
+        Database._shared_db_r = None
+        self.logger.info("DB connection has been closed.")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    @property
+    def cur(self):
+        """
+        Returns the cursor of the calling thread, creating it on first use. The connection is shared across threads
+        (``check_same_thread=False``), but every thread gets its own cursor so concurrent reads don't clobber each
+        others pending result sets.
+
+        :return: Cursor bound to the calling thread.
+        :rtype: sqlite3.Cursor
+        """
+        cur = getattr(self._local, 'cur', None)
+        if cur is None:
+            cur = self._local.cur = self.db.cursor()
+        return cur
+
+    @property
+    def rcur(self):
+        """
+        Returns the calling threads cursor on the read-only connection. SELECT-only methods go through this one,
+        everything that writes stays on ``cur``.
+
+        :return: Read-only cursor bound to the calling thread.
+        :rtype: sqlite3.Cursor
+        """
+        cur = getattr(self._local, 'rcur', None)
+        if cur is None:
+            cur = self._local.rcur = self.db_r.cursor()
+        return cur
 
     def database_init(self):
         """
@@ -61,22 +225,24 @@ class Database:
 
         if not self._database_check_if_exists('storage'):
             self.cur.execute(
-                'CREATE TABLE IF NOT EXISTS storage (thing_id STR(15), bot_module INT(5), timestamp datetime)'
+                'CREATE TABLE IF NOT EXISTS storage (thing_id STR(15), bot_module INT(5), timestamp INTEGER, '
+                'FOREIGN KEY (bot_module) REFERENCES modules (id))'
             )
             info('storage')
 
         if not self._database_check_if_exists('update_threads'):
             self.cur.execute(
                 'CREATE TABLE IF NOT EXISTS update_threads '
-                '(thing_id STR(15) NOT NULL, bot_module INT(5), created DATETIME, '
-                'lifetime DATETIME, last_updated DATETIME, interval INT(5))'
+                '(thing_id STR(15) NOT NULL, bot_module INT(5), created INTEGER, '
+                'lifetime INTEGER, last_updated INTEGER, interval INT(5), '
+                'FOREIGN KEY (bot_module) REFERENCES modules (id))'
             )
             info('update_threads')
 
         if not self._database_check_if_exists('modules'):
             self.cur.execute(
                 'CREATE TABLE IF NOT EXISTS modules '
-                '(module_name STR(50))'
+                '(id INTEGER PRIMARY KEY, module_name STR(50))'
             )
             info('modules')
 
@@ -113,12 +279,117 @@ class Database:
             self.cur.execute(
                 '''CREATE TABLE IF NOT EXISTS meta_stats
                       (day DATE NOT NULL,
-                       seen_submissions INT(10) DEFAULT 0,
-                       seen_comments INT(10) DEFAULT 0,
-                       update_cycles INT(10) DEFAULT 0)
+                       seen_submissions INT(10) NOT NULL DEFAULT 0,
+                       seen_comments INT(10) NOT NULL DEFAULT 0,
+                       update_cycles INT(10) NOT NULL DEFAULT 0)
                 ''')
             info('meta_stats')
 
+        self._migrate_to_unixtime()
+
+        # Indexes on the hot predicates - lookups by thing, module or age would be full table scans otherwise and
+        # the storage table grows with every processed comment and submission.
+        for index in (
+            'CREATE INDEX IF NOT EXISTS idx_storage_thing_module ON storage (thing_id, bot_module)',
+            'CREATE INDEX IF NOT EXISTS idx_storage_timestamp ON storage (timestamp)',
+            'CREATE INDEX IF NOT EXISTS idx_update_module_last ON update_threads (bot_module, last_updated)',
+            'CREATE INDEX IF NOT EXISTS idx_update_lifetime ON update_threads (lifetime)',
+            'CREATE UNIQUE INDEX IF NOT EXISTS idx_modules_name ON modules (module_name)',
+            'CREATE INDEX IF NOT EXISTS idx_update_thing_module ON update_threads (thing_id, bot_module)',
+            'CREATE INDEX IF NOT EXISTS idx_userbans_user_module ON userbans (username, bot_module)',
+            'CREATE INDEX IF NOT EXISTS idx_subbans_sub_module ON subbans (subreddit, bot_module)',
+            'CREATE INDEX IF NOT EXISTS idx_stats_created ON stats (created)',
+            # get_karma_loads only ever looks at rows still waiting for their karma count
+            'CREATE INDEX IF NOT EXISTS idx_stats_karma_pending ON stats (created) WHERE upvotes_author IS NULL',
+            'CREATE UNIQUE INDEX IF NOT EXISTS idx_meta_day ON meta_stats (day)',
+            'CREATE INDEX IF NOT EXISTS idx_messages_module ON messages (bot_module)',
+            # composite (module, created) indexes so per-module time-range queries probe instead of scanning
+            'CREATE INDEX IF NOT EXISTS idx_stats_module_created ON stats (bot_module, created)',
+            'CREATE INDEX IF NOT EXISTS idx_messages_module_created ON messages (bot_module, created)',
+        ):
+            self.cur.execute(index)
+        self.cur.execute('ANALYZE')  # seeds the query planner statistics once per startup.
+
+    def _migrate_to_unixtime(self):
+        """
+        One-time migration for databases from before the timestamp columns of ``storage`` and ``update_threads``
+        became unix seconds. The old DATETIME text columns forced a string parse and compare per scanned row;
+        integers compare directly and work with the indexes. Detects the legacy schema via ``PRAGMA table_info``
+        and rewrites the affected tables in place. Also gives the modules table its explicit ``id`` primary key
+        (an alias for the rowid it always had), which the foreign keys of the rebuilt tables point at.
+        """
+        def column_types(table):
+            self.cur.execute('PRAGMA table_info({})'.format(table))
+            return {row[1]: row[2].upper() for row in self.cur.fetchall()}
+
+        if 'id' not in column_types('modules'):
+            with self.transaction():
+                self.cur.execute('ALTER TABLE modules RENAME TO modules_legacy')
+                self.cur.execute('CREATE TABLE modules (id INTEGER PRIMARY KEY, module_name STR(50))')
+                self.cur.execute('INSERT INTO modules SELECT _ROWID_, module_name FROM modules_legacy')
+                self.cur.execute('DROP TABLE modules_legacy')
+            self.logger.info("Table 'modules' has been migrated to an explicit primary key.")
+
+        if column_types('storage').get('timestamp') != 'INTEGER':
+            with self.transaction():
+                self.cur.execute('ALTER TABLE storage RENAME TO storage_legacy')
+                self.cur.execute(
+                    'CREATE TABLE storage (thing_id STR(15), bot_module INT(5), timestamp INTEGER, '
+                    'FOREIGN KEY (bot_module) REFERENCES modules (id))'
+                )
+                self.cur.execute("INSERT INTO storage SELECT thing_id, bot_module, strftime('%s', timestamp) "
+                                 "FROM storage_legacy")
+                self.cur.execute('DROP TABLE storage_legacy')
+            self.logger.info("Table 'storage' has been migrated to unix timestamps.")
+
+        if column_types('update_threads').get('created') != 'INTEGER':
+            with self.transaction():
+                self.cur.execute('ALTER TABLE update_threads RENAME TO update_threads_legacy')
+                self.cur.execute(
+                    'CREATE TABLE update_threads '
+                    '(thing_id STR(15) NOT NULL, bot_module INT(5), created INTEGER, '
+                    'lifetime INTEGER, last_updated INTEGER, interval INT(5), '
+                    'FOREIGN KEY (bot_module) REFERENCES modules (id))'
+                )
+                self.cur.execute("INSERT INTO update_threads "
+                                 "SELECT thing_id, bot_module, strftime('%s', created), strftime('%s', lifetime), "
+                                 "strftime('%s', last_updated), interval FROM update_threads_legacy")
+                self.cur.execute('DROP TABLE update_threads_legacy')
+            self.logger.info("Table 'update_threads' has been migrated to unix timestamps.")
+
+        # The unique indexes created right after this migration refuse duplicates that legacy databases can
+        # legitimately hold: the old unsynchronized meta writes could insert the same day twice, and the same
+        # goes for module names. Collapse them here or the index creation aborts the whole startup.
+        self.cur.execute('SELECT MIN(id), module_name FROM modules GROUP BY module_name HAVING COUNT(*) > 1')
+        duplicated = self.cur.fetchall()
+        if duplicated:
+            with self.transaction():
+                for keep, name in duplicated:
+                    self.cur.execute('SELECT id FROM modules WHERE module_name = (?) AND id != (?)', (name, keep))
+                    stale = [row[0] for row in self.cur.fetchall()]
+                    for table in ('storage', 'update_threads', 'userbans', 'subbans', 'stats', 'messages'):
+                        self.cur.executemany('UPDATE {} SET bot_module = (?) WHERE bot_module = (?)'.format(table),
+                                             [(keep, rowid) for rowid in stale])
+                    self.cur.executemany('DELETE FROM modules WHERE id = (?)', [(rowid,) for rowid in stale])
+            self.logger.info("Collapsed {} duplicated module name(s) during migration.".format(len(duplicated)))
+
+        self.cur.execute('SELECT COUNT(*) FROM (SELECT day FROM meta_stats GROUP BY day HAVING COUNT(*) > 1)')
+        if self.cur.fetchone()[0]:
+            with self.transaction():
+                self.cur.execute('ALTER TABLE meta_stats RENAME TO meta_stats_legacy')
+                self.cur.execute(
+                    '''CREATE TABLE meta_stats
+                          (day DATE NOT NULL,
+                           seen_submissions INT(10) NOT NULL DEFAULT 0,
+                           seen_comments INT(10) NOT NULL DEFAULT 0,
+                           update_cycles INT(10) NOT NULL DEFAULT 0)
+                    ''')
+                self.cur.execute('INSERT INTO meta_stats '
+                                 'SELECT day, SUM(seen_submissions), SUM(seen_comments), SUM(update_cycles) '
+                                 'FROM meta_stats_legacy GROUP BY day')
+                self.cur.execute('DROP TABLE meta_stats_legacy')
+            self.logger.info("Table 'meta_stats' held duplicated days and has been aggregated per day.")
+
     def _database_check_if_exists(self, table_name):
         """
         Helper method to check if a certain table (by name) exists. Refrain from using it if you're not adding new
@@ -127,9 +398,41 @@ class Database:
         :type table_name: str
         :return: Tuple of the table name, empty if it doesn't exist.
         """
-        self.cur.execute('SELECT name FROM sqlite_master WHERE  type="table" AND name=(?)', (table_name,))
+        self._exec('check_table', (table_name,))
         return self.cur.fetchone()
 
+    def _exec(self, name, params=()):
+        """
+        Helper method to run one of the prepared hot-path statements from ``_stmts``. Reusing the exact same SQL
+        string per call keeps the statement inside sqlite3's internal statement cache.
+
+        :param name: Symbolic name of the statement within ``_stmts``.
+        :type name: str
+        :param params: Parameters bound into the statement.
+        :type params: tuple
+        """
+        with self._write_lock:  # keeps the autocommit statement out of another thread's open transaction
+            self.cur.execute(self._stmts[name], params)
+
+    @contextmanager
+    def transaction(self):
+        """
+        Context manager that groups all statements issued within its block into one explicit transaction. Since the
+        connection runs in autocommit mode, every single statement otherwise pays its own commit and disk sync - for
+        batches of inserts this collapses all of that into a single commit.
+
+        Usage: ``with db.transaction(): db.insert_into_storage(...)``
+        """
+        with self._write_lock:  # keeps a second writer thread from committing into a half-done transaction
+            self.cur.execute('BEGIN IMMEDIATE')
+            try:
+                yield self
+            except Exception:
+                self.cur.execute('ROLLBACK')
+                raise
+            else:
+                self.cur.execute('COMMIT')
+
     def insert_into_storage(self, thing_id, module):
         """
         Stores a certain thing (id of comment or submission) into the storage, which is for the session consistency.
@@ -139,20 +442,96 @@ class Database:
         :param module: A string naming your plugin.
         :type module: str
         """
-        self.cur.execute('INSERT INTO storage VALUES ((?), (SELECT _ROWID_ FROM modules WHERE module_name=(?)), '
-                         'CURRENT_TIMESTAMP)', (thing_id, module))
+        mid = self._mid(module)
+        self._exec('insert_storage', (thing_id, mid))
+        seen = self._seen
+        seen[(thing_id, mid)] = (thing_id, mid, int(time.time()))
+        if len(seen) > self._SEEN_CAP:
+            seen.popitem(last=False)
         self.logger.debug('{} from {} inserted into storage.'.format(thing_id, module))
 
+    def insert_many_storage(self, rows):
+        """
+        Stores many things at once inside a single transaction. Preferred over calling ``insert_into_storage`` in a
+        loop, since all rows share one commit and one prepared statement.
+
+        :param rows: Iterable of ``(thing_id, module)`` tuples.
+        :type rows: iterable
+        """
+        now = int(time.time())
+        resolved = [(thing_id, self._mid(module), now) for thing_id, module in rows]
+        self._bulk_insert('storage', ('thing_id', 'bot_module', 'timestamp'), resolved)
+        self.logger.debug('Inserted a batch of things into storage.')
+
+    def _bulk_insert(self, table, cols, rows, chunk=100):
+        """
+        Inserts rows through a multi-VALUES statement, binding ``chunk`` rows per execute. For big batches this
+        shares one parse/plan across many rows instead of dispatching one VDBE program each, while the constant
+        chunk size keeps the expanded SQL string stable for the statement cache. The remainder rows go through a
+        plain single-row executemany.
+
+        :param table: Name of the target table.
+        :type table: str
+        :param cols: Column names the values map onto.
+        :type cols: tuple
+        :param rows: List of value tuples, each matching ``cols``.
+        :type rows: list
+        :param chunk: Rows per expanded statement, capped so the placeholder count stays below sqlite's limit of 999.
+        :type chunk: int
+        """
+        if not rows:
+            return
+        chunk = min(chunk, 999 // len(cols))
+        group = '({})'.format(', '.join('?' * len(cols)))
+        head = 'INSERT INTO {} ({}) VALUES '.format(table, ', '.join(cols))
+        chunked_sql = head + ', '.join([group] * chunk)
+        with self.transaction():
+            full = len(rows) // chunk * chunk
+            for start in range(0, full, chunk):
+                flat = [value for row in rows[start:start + chunk] for value in row]
+                self.cur.execute(chunked_sql, flat)
+            if full < len(rows):
+                self.cur.executemany(head + group, rows[full:])
+
+    def _fetch_in_batches(self, cursor, batch_size=1000):
+        """
+        Yields rows from an already placed cursor in batches, so big result sets never get materialized as one
+        Python list. The cursor is dedicated to the generator and closed when it is exhausted.
+
+        :param cursor: Cursor with a pending result set.
+        :type cursor: sqlite3.Cursor
+        :param batch_size: How many rows to pull per ``fetchmany`` round trip.
+        :type batch_size: int
+        """
+        try:
+            while True:
+                rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    return
+                yield from rows
+        finally:
+            cursor.close()
+
+    def iter_all_storage(self):
+        """
+        Streams all elements inside the bot storage.
+
+        :return: Generator of tuples with all storage elements with ``(thing_id, module_name, timestamp)``
+        """
+        cur = self.db_r.cursor()
+        cur.execute("""SELECT thing_id, module_name, timestamp FROM storage
+                       INNER JOIN modules
+                       ON storage.bot_module = modules._ROWID_""")
+        return self._fetch_in_batches(cur)
+
     def get_all_storage(self):
         """
-        Returns all elements inside the bot storage.
+        Returns all elements inside the bot storage at once; prefer ``iter_all_storage`` when a single pass is
+        enough.
 
-        :return: Tuple with tuples with all storage elements with ``(thing_id, module_name, timestamp)``
+        :return: List of tuples with all storage elements with ``(thing_id, module_name, timestamp)``
         """
-        self.cur.execute("""SELECT thing_id, module_name, timestamp FROM storage
-                            INNER JOIN modules
-                            ON storage.bot_module = modules._ROWID_""")
-        return self.cur.fetchall()
+        return list(self.iter_all_storage())
 
     def retrieve_thing(self, thing_id, module):
         """
@@ -165,13 +544,19 @@ class Database:
         :type module: str
         :return: Tuple with ``(thing_id, bot_module, timestamp)``
         """
-        self._error_if_not_exists(module)
-        self.cur.execute("""SELECT thing_id, bot_module, timestamp FROM storage
-                            WHERE thing_id = (?)
-                            AND bot_module = (SELECT _ROWID_ FROM modules WHERE module_name=(?))
-                            LIMIT 1""",
-                         (thing_id, module,))
-        return self.cur.fetchone()
+        key = (thing_id, self._mid(module))
+        seen = self._seen
+        row = seen.get(key)
+        if row is not None:
+            seen.move_to_end(key)
+            return row
+        self.rcur.execute(self._stmts['retrieve_thing'], key)
+        row = self.rcur.fetchone()
+        if row is not None:  # misses stay uncached - an unanswered thing can become answered any moment
+            seen[key] = row
+            if len(seen) > self._SEEN_CAP:
+                seen.popitem(last=False)
+        return row
 
     def delete_from_storage(self, min_timestamp):
         """
@@ -180,7 +565,8 @@ class Database:
         :param min_timestamp: Unix timestamp where all entries in storage get deleted if they're older than that.
         :type min_timestamp: int | float
         """
-        self.cur.execute("DELETE FROM storage WHERE timestamp <= datetime((?), 'unixepoch')", (min_timestamp,))
+        with self._write_lock:
+            self.cur.execute("DELETE FROM storage WHERE timestamp <= (?)", (int(min_timestamp),))
         self.logger.debug('Deleted everything from storage older than {}'.format(min_timestamp))
 
     def select_from_storage(self, older_than_timestamp):
@@ -189,10 +575,11 @@ class Database:
 
         :param older_than_timestamp: Unix timestamp of which time everything has to be selected before.
         :type older_than_timestamp: int | float
-        :return: Tuples of ``(thing_id, bot_module, timestamp)``
+        :return: Generator of tuples of ``(thing_id, bot_module, timestamp)``
         """
-        self.cur.execute("SELECT * FROM storage WHERE timestamp <= datetime((?), 'unixepoch')", (older_than_timestamp,))
-        return self.cur.fetchall()
+        cur = self.db_r.cursor()
+        cur.execute("SELECT * FROM storage WHERE timestamp <= (?)", (int(older_than_timestamp),))
+        return self._fetch_in_batches(cur)
 
     def insert_into_update(self, thing_id, module, lifetime, interval):
         """
@@ -208,52 +595,94 @@ class Database:
         :param interval: Interval of how often you'd want this to update in seconds.
         :type interval: int
         """
-        self._error_if_not_exists(module)
-        self.cur.execute("""
-                        INSERT INTO update_threads (thing_id, bot_module, created, lifetime, last_updated, interval)
-                            VALUES (
-                                (?),
-                                (SELECT _ROWID_ FROM modules WHERE module_name=(?)),
-                                CURRENT_TIMESTAMP,
-                                datetime('now', '+' || (?) || ' seconds'),
-                                CURRENT_TIMESTAMP,
-                                (?))
-                         """,
-                         (thing_id, module, lifetime, interval,))
+        now = int(time.time())
+        self._exec('insert_update', (thing_id, self._mid(module), now, now + lifetime, now, interval,))
+        Database._update_seq += 1
         self.logger.debug('Inserted {} from {} to update - lifetime: {} | interval: {}'.format(thing_id, module,
                                                                                                lifetime, interval))
 
+    def insert_many_into_update(self, rows):
+        """
+        Inserts many thing_ids into the update-table at once. The module names are resolved to their rowids a single
+        time up front, so the insert itself needs no sub-select, and all rows share one transaction and one prepared
+        statement.
+
+        :param rows: Iterable of ``(thing_id, module, lifetime, interval)`` tuples.
+        :type rows: iterable
+        :raise LookupError: If one of the modules has not been registered.
+        """
+        now = int(time.time())
+        resolved = []
+        for thing_id, module, lifetime, interval in rows:
+            resolved.append((thing_id, self._mid(module), now, now + lifetime, now, interval))
+        with self.transaction():
+            self.cur.executemany(self._stmts['insert_update'], resolved)
+        Database._update_seq += 1
+        self.logger.debug('Inserted a batch of {} things to update.'.format(len(resolved)))
+
+    def update_seq(self):
+        """
+        Returns the process-wide update registration counter. Two equal samples mean no update thread was
+        registered in between, through any instance.
+
+        :return: Monotonically increasing counter of update registrations.
+        :rtype: int
+        """
+        return Database._update_seq
+
+    def next_update_due(self):
+        """
+        Returns the unix timestamp at which the earliest registered update thread becomes due, or None when
+        nothing is registered. The update thread sleeps exactly as long as the rows allow instead of a fixed
+        interval.
+
+        :return: Unix timestamp of the earliest due row, or None.
+        :rtype: int | None
+        """
+        self.rcur.execute('SELECT MIN(last_updated + interval) FROM update_threads')
+        return self.rcur.fetchone()[0]
+
+    def iter_all_update(self):
+        """
+        Streams all elements inside the update_htreads table.
+
+        :return: Generator of tuples of ``(thing_id, module_name, created, lifetime, last_updated, interval)``
+        """
+        cur = self.db_r.cursor()
+        cur.execute("""SELECT thing_id, module_name, created, lifetime, last_updated, interval
+                       FROM update_threads
+                       INNER JOIN modules
+                       ON update_threads.bot_module = modules._ROWID_
+                       ORDER BY last_updated ASC""")
+        return self._fetch_in_batches(cur)
+
     def get_all_update(self):
         """
-        Returns all elements inside the update_htreads table.
+        Returns all elements inside the update_htreads table at once; prefer ``iter_all_update`` for a single pass.
 
-        :return: Tuple with tuples of ``(thing_id, module_name, created, lifetime, last_updated, interval)``
+        :return: List of tuples of ``(thing_id, module_name, created, lifetime, last_updated, interval)``
         """
-        self.cur.execute("""SELECT thing_id, module_name, created, lifetime, last_updated, interval
-                            FROM update_threads
-                            INNER JOIN modules
-                            ON update_threads.bot_module = modules._ROWID_
-                            ORDER BY last_updated ASC""")
-        return self.cur.fetchall()
+        return list(self.iter_all_update())
 
-    def _select_to_update(self, module):
+    def _select_to_update(self, module, cursor=None):
         """
         Selector method to get the cursor selecting all outstanding threads to update for a certain module. Refrain from
         using it, since it only places the cursor.
 
         :param module: A string naming your plugin.
         :type module: str
-        """
-        self._error_if_not_exists(module)
-        self.cur.execute("""SELECT thing_id, module_name, created, lifetime, last_updated, interval
-                            FROM update_threads
-                            INNER JOIN modules
-                            ON update_threads.bot_module = modules._ROWID_
-                            WHERE modules.module_name = (?)
-                            AND CURRENT_TIMESTAMP > (datetime(update_threads.last_updated,
-                                                                '+' || update_threads.interval || ' seconds'))
-                            ORDER BY last_updated ASC""",
-                         (module,))
+        :param cursor: Optional dedicated cursor; defaults to the calling threads cursor.
+        :type cursor: sqlite3.Cursor | None
+        """
+        # The module name is echoed back as a bound literal: the caller filters on one module anyway, so the
+        # join against the modules table only existed to decorate rows with a name we already know.
+        (cursor or self.cur).execute(
+            """SELECT thing_id, (?), created, lifetime, last_updated, interval
+               FROM update_threads
+               WHERE bot_module = (?)
+               AND (?) > (last_updated + interval)
+               ORDER BY last_updated ASC""",
+            (module, self._mid(module), int(time.time())))
 
     def get_latest_to_update(self, module):
         """
@@ -274,9 +703,32 @@ class Database:
         :type module: str
         :return: Tuple with tuples of ``(thing_id, module_name, created, lifetime, last_updated, interval)``
         """
+        # Deliberately materialized: the update thread bumps last_updated while looping over this result, and a
+        # live cursor ordered by last_updated would see those rows again (the Halloween problem).
         self._select_to_update(module)
         return self.cur.fetchall()
 
+    def get_all_updates_grouped(self):
+        """
+        Loads every due update thread in one query and groups the rows by module name. The update cycle otherwise
+        issues one SELECT per registered plugin even when nothing is due at all.
+
+        :return: Mapping of module name onto lists of
+                 ``(thing_id, module_name, created, lifetime, last_updated, interval)``
+        :rtype: dict
+        """
+        names = {rowid: name for name, rowid in self._module_ids.items()}
+        grouped = {}
+        # materialized for the same Halloween-problem reason as get_all_to_update
+        self.cur.execute("""SELECT thing_id, bot_module, created, lifetime, last_updated, interval
+                            FROM update_threads
+                            WHERE (?) > (last_updated + interval)
+                            ORDER BY bot_module, last_updated ASC""", (int(time.time()),))
+        for thing_id, bot_module, created, lifetime, last_updated, interval in self.cur.fetchall():
+            name = names.get(bot_module)
+            grouped.setdefault(name, []).append((thing_id, name, created, lifetime, last_updated, interval))
+        return grouped
+
     def update_timestamp_in_update(self, thing_id, module):
         """
         Updates the timestamp when a thing_id was updated last.
@@ -286,12 +738,7 @@ class Database:
         :param module: A string naming your plugin.
         :type module: str
         """
-        self._error_if_not_exists(module)
-        self.cur.execute("""UPDATE update_threads
-                            SET last_updated=CURRENT_TIMESTAMP
-                            WHERE thing_id=(?)
-                            AND bot_module = (SELECT _ROWID_ FROM modules WHERE module_name = (?))""",
-                         (thing_id, module))
+        self._exec('update_timestamp', (thing_id, self._mid(module)))
         self.logger.debug('Updated timestamp on {} from {}'.format(thing_id, module))
 
     def delete_from_update(self, thing_id, module):
@@ -303,11 +750,7 @@ class Database:
         :param module: A string naming your plugin.
         :type module: str
         """
-        self._error_if_not_exists(module)
-        self.cur.execute("""DELETE FROM update_threads
-                            WHERE thing_id=(?)
-                            AND bot_module = (SELECT _ROWID_ FROM modules WHERE module_name = (?))
-                            AND CURRENT_TIMESTAMP > lifetime""", (thing_id, module))
+        self._exec('delete_update', (thing_id, self._mid(module)))
 
     def register_module(self, module):
         """
@@ -318,16 +761,32 @@ class Database:
         """
         if self._check_if_module_exists(module):
             return
-        self.cur.execute('INSERT INTO modules VALUES ((?))', (module,))
+        # INSERT OR IGNORE piggybacks on the unique index, so two threads racing the same registration can't
+        # both insert; the loser just reads back the winners id.
+        with self._write_lock:
+            self.cur.execute('INSERT OR IGNORE INTO modules (module_name) VALUES ((?))', (module,))
+            if self.cur.rowcount:
+                self._module_ids[module] = self.cur.lastrowid
+            else:
+                self.cur.execute('SELECT id FROM modules WHERE module_name = (?)', (module,))
+                self._module_ids[module] = self.cur.fetchone()[0]
         self.logger.debug("Module {} has been registered.".format(module))
 
+    def iter_all_userbans(self):
+        """
+        Streams all bans stored in the userban table.
+        :return: Generator of tuples ``(username, bot_module)``
+        """
+        cur = self.db_r.cursor()
+        cur.execute('SELECT * FROM userbans')
+        return self._fetch_in_batches(cur)
+
     def get_all_userbans(self):
         """
         Returns all bans stored in the userban table.
-        :return: Tuple of tuples ``(username, bot_module)``
+        :return: List of tuples ``(username, bot_module)``
         """
-        self.cur.execute('SELECT * FROM userbans')
-        return self.cur.fetchall()
+        return list(self.iter_all_userbans())
 
     def get_all_bans_per_user(self, username):
         """
@@ -336,8 +795,8 @@ class Database:
         :type username: str
         :return: Tuple of tuples ``(username, bot_module)``
         """
-        self.cur.execute('SELECT * FROM userbans WHERE username = (?) LIMIT 1', (username,))
-        return self.cur.fetchall()
+        self.rcur.execute('SELECT * FROM userbans WHERE username = (?) LIMIT 1', (username,))
+        return self.rcur.fetchall()
 
     def check_user_ban(self, username, module):
         """
@@ -349,18 +808,10 @@ class Database:
         :type module: str
         :return: Boolean if banned or not.
         """
-        self.cur.execute('SELECT * FROM userbans '
-                         'WHERE username = (?) AND '
-                         'bot_module = (SELECT _ROWID_ FROM modules WHERE module_name = (?)) '
-                         'LIMIT 1', (username, module))
-        if self.cur.fetchone():
-            return True
-
-        self.cur.execute('SELECT * FROM userbans '
-                         'WHERE username = (?) AND '
-                         'bot_module = (SELECT _ROWID_ FROM modules WHERE module_name IS NULL    ) '
-                         'LIMIT 1', (username,))
-        return self.cur.fetchone() is True
+        self.rcur.execute('SELECT 1 FROM userbans '
+                          'WHERE username = (?) AND (bot_module = (?) OR bot_module IS NULL) '
+                          'LIMIT 1', (username, self._mid(module)))
+        return self.rcur.fetchone() is not None
 
     def add_userban_per_module(self, username, module):
         """
@@ -371,8 +822,10 @@ class Database:
         :param module: A string naming your plugin.
         :type module: str
         """
-        self.cur.execute("INSERT INTO userbans (username, bot_module) "
-                         "VALUES ((?), (SELECT _ROWID_ FROM modules WHERE module_name = (?)))", (username, module))
+        with self._write_lock:
+            self.cur.execute("INSERT INTO userbans (username, bot_module) "
+                             "VALUES ((?), (SELECT _ROWID_ FROM modules WHERE module_name = (?)))",
+                             (username, module))
         self.logger.debug('User {} got banned on {}'.format(username, module))
 
     def add_userban_globally(self, username):
@@ -382,8 +835,9 @@ class Database:
         :param username: Author in fulltext in question
         :type username: str
         """
-        self.cur.execute("INSERT INTO userbans (username, bot_module) "
-                         "VALUES ((?), NULL)", (username,))
+        with self._write_lock:
+            self.cur.execute("INSERT INTO userbans (username, bot_module) "
+                             "VALUES ((?), NULL)", (username,))
         self.logger.debug('User {} got banned across all modules.'.format(username))
 
     def remove_userban_per_module(self, username, module):
@@ -395,8 +849,9 @@ class Database:
         :param module: A string naming your plugin.
         :type module: str
         """
-        self.cur.execute("DELETE FROM userbans WHERE username = (?) AND "
-                         "bot_module = (SELECT _ROWID_ FROM modules WHERE modules = (?))", (username, module))
+        with self._write_lock:
+            self.cur.execute("DELETE FROM userbans WHERE username = (?) AND bot_module = (?)",
+                             (username, self._mid(module)))
         self.logger.debug('User {} got unbanned on {}'.format(username, module))
 
     def remove_userban_globally(self, username):
@@ -406,22 +861,32 @@ class Database:
         :param username: Author in fulltext in question
         :type username: str
         """
-        self.cur.execute("DELETE FROM userbans WHERE username = (?)", (username,))
+        with self._write_lock:
+            self.cur.execute("DELETE FROM userbans WHERE username = (?)", (username,))
         self.logger.debug('User {} got unbanned across all modules.'.format(username))
 
     def purge_all_user_bans(self):
         """
         Removes **all** bans for **all** users - no exception, clears the entire table.
         """
-        self.cur.execute("DELETE FROM userbans")
+        with self._write_lock:
+            self.cur.execute("DELETE FROM userbans")
         self.logger.debug('Removed all userbans!')
 
+    def iter_all_banned_subreddits(self):
+        """
+        Streams all bans stored in the subreddit ban table
+        :return: Generator of tuples ``(subreddit, bot_module)``
+        """
+        cur = self.db_r.cursor()
+        cur.execute('SELECT * FROM subbans')
+        return self._fetch_in_batches(cur)
+
     def get_all_banned_subreddits(self):
         """
         Returns all bans stored in the subreddit ban table
         """
-        self.cur.execute('SELECT * FROM subbans')
-        return self.cur.fetchall()
+        return list(self.iter_all_banned_subreddits())
 
     def get_all_bans_per_subreddit(self, subreddit):
         """
@@ -429,8 +894,8 @@ class Database:
         :param subreddit: Author in fulltext in question
         :type subreddit: str
         """
-        self.cur.execute('SELECT * FROM subbans WHERE subreddit = (?) LIMIT 1', (subreddit,))
-        return self.cur.fetchall()
+        self.rcur.execute('SELECT * FROM subbans WHERE subreddit = (?) LIMIT 1', (subreddit,))
+        return self.rcur.fetchall()
 
     def check_subreddit_ban(self, subreddit, module):
         """
@@ -442,18 +907,29 @@ class Database:
         :type module: str
         :return: Boolean, True if banned, False if not.
         """
-        self.cur.execute('SELECT * FROM subbans '
-                         'WHERE subreddit = (?) AND '
-                         'bot_module = (SELECT _ROWID_ FROM modules WHERE module_name = (?)) '
-                         'LIMIT 1', (subreddit, module))
-        if self.cur.fetchone():
-            return True
+        self.rcur.execute('SELECT 1 FROM subbans '
+                          'WHERE subreddit = (?) AND (bot_module = (?) OR bot_module IS NULL) '
+                          'LIMIT 1', (subreddit, self._mid(module)))
+        return self.rcur.fetchone() is not None
+
+    def load_all_bans(self):
+        """
+        Loads every user and subreddit ban in two scans, grouped by module name. Stream filters can then test
+        plain set membership per item instead of running two SELECTs for each (thing, plugin) pair.
 
-        self.cur.execute('SELECT * FROM subbans '
-                         'WHERE subreddit = (?) AND '
-                         'bot_module = (SELECT _ROWID_ FROM modules WHERE module_name IS NULL    ) '
-                         'LIMIT 1', (subreddit,))
-        return self.cur.fetchone() is True
+        :return: Mapping of module name onto ``(banned_users, banned_subreddits)`` sets. The ``None`` key carries
+                 the global bans that apply to every plugin.
+        :rtype: dict
+        """
+        names = {rowid: name for name, rowid in self._module_ids.items()}
+        bans = {}
+        self.rcur.execute('SELECT username, bot_module FROM userbans')
+        for username, bot_module in self.rcur.fetchall():
+            bans.setdefault(names.get(bot_module), (set(), set()))[0].add(username)
+        self.rcur.execute('SELECT subreddit, bot_module FROM subbans')
+        for subreddit, bot_module in self.rcur.fetchall():
+            bans.setdefault(names.get(bot_module), (set(), set()))[1].add(subreddit)
+        return bans
 
     def add_subreddit_ban_per_module(self, subreddit, module):
         """
@@ -464,8 +940,10 @@ class Database:
         :param module: A string naming your plugin.
         :type module: str
         """
-        self.cur.execute("INSERT INTO subbans (subreddit, bot_module) "
-                         "VALUES ((?), (SELECT _ROWID_ FROM modules WHERE module_name = (?)))", (subreddit, module))
+        with self._write_lock:
+            self.cur.execute("INSERT INTO subbans (subreddit, bot_module) "
+                             "VALUES ((?), (SELECT _ROWID_ FROM modules WHERE module_name = (?)))",
+                             (subreddit, module))
         self.logger.debug('Subreddit {} got banned on {}'.format(subreddit, module))
 
     def add_subreddit_ban_globally(self, subreddit):
@@ -475,8 +953,9 @@ class Database:
         :param subreddit: Author in fulltext in question
         :type subreddit: str
         """
-        self.cur.execute("INSERT INTO subbans (subreddit, bot_module) "
-                         "VALUES ((?), NULL)", (subreddit,))
+        with self._write_lock:
+            self.cur.execute("INSERT INTO subbans (subreddit, bot_module) "
+                             "VALUES ((?), NULL)", (subreddit,))
         self.logger.debug('Subreddit {} got banned across all modules.'.format(subreddit))
 
     def remove_subreddit_ban_per_module(self, subreddit, module):
@@ -488,8 +967,9 @@ class Database:
         :param module: A string naming your plugin.
         :type module: str
         """
-        self.cur.execute("DELETE FROM subbans WHERE subreddit = (?) AND "
-                         "bot_module = (SELECT _ROWID_ FROM modules WHERE modules = (?))", (subreddit, module))
+        with self._write_lock:
+            self.cur.execute("DELETE FROM subbans WHERE subreddit = (?) AND bot_module = (?)",
+                             (subreddit, self._mid(module)))
         self.logger.debug('Subreddit {} got unbanned on {}'.format(subreddit, module))
 
     def remove_subreddit_ban_globally(self, subreddit):
@@ -499,14 +979,16 @@ class Database:
         :param subreddit: Author in fulltext in question
         :type subreddit: str
         """
-        self.cur.execute("DELETE FROM subbans WHERE subreddit = (?)", (subreddit,))
+        with self._write_lock:
+            self.cur.execute("DELETE FROM subbans WHERE subreddit = (?)", (subreddit,))
         self.logger.debug('Subreddit {} got unbanned across all modules.'.format(subreddit))
 
     def purge_all_subreddit_bans(self):
         """
         Removes all subreddit bans from the table - no exceptions, clears the table.
         """
-        self.cur.execute("DELETE FROM subbans")
+        with self._write_lock:
+            self.cur.execute("DELETE FROM subbans")
         self.logger.debug('All subreddit bans removed!')
 
     def _check_if_module_exists(self, module):
@@ -516,17 +998,8 @@ class Database:
         :param module: A string naming your plugin.
         :type module: str
         :return: Boolean determining if a module already has been registered.
-        :raise ValueError: In case of a module being registered multiple times - which should never happen - the
-                           ``Database`` object will raise a value error.
-        """
-        self.cur.execute('SELECT COUNT(*) FROM modules WHERE module_name = (?)', (module,))
-        result = self.cur.fetchone()
-        if result[0] == 0:
-            return False
-        if result[0] == 1:
-            return True
-        if result[0] > 1:
-            raise ValueError("A module was registered multiple times and is therefore inconsistent. Call for help.")
+        """
+        return module in self._module_ids
 
     def _error_if_not_exists(self, module):
         """
@@ -540,6 +1013,22 @@ class Database:
         if not self._check_if_module_exists(module):
             raise LookupError('The module where this operation comes from is not registered!')
 
+    def _mid(self, module):
+        """
+        Resolves a module name to its cached id, so the SQL binds a plain integer instead of running a sub-select
+        against the modules table.
+
+        :param module: A string naming your plugin.
+        :type module: str
+        :return: The id of the module in the modules table.
+        :rtype: int
+        :raise LookupError: If the module has not been registered.
+        """
+        try:
+            return self._module_ids[module]
+        except KeyError:
+            raise LookupError('The module where this operation comes from is not registered!') from None
+
     def get_all_modules(self):
         """
         Returns all modules that have been registered so far.
@@ -557,10 +1046,20 @@ class Database:
         :param older_than_unixtime: Unix timestamp from which point entries have to be older than to be deleted.
         :type older_than_unixtime: int | float
         """
-        self.cur.execute("""DELETE FROM storage WHERE timestamp < datetime((?), 'unixepoch')""", (older_than_unixtime,))
-        self.cur.execute("""DELETE FROM update_threads WHERE CURRENT_TIMESTAMP > lifetime""")
-        self.logger.debug('Database cleanup: All storage items older than '
-                          '{} and all deprecated update-threads removed'.format(older_than_unixtime))
+        with self.transaction():  # one commit for both DELETEs, so the cleanup pays for a single WAL flush
+            self.cur.execute("""DELETE FROM storage WHERE timestamp < (?)""", (int(older_than_unixtime),))
+            removed_storage = self.cur.rowcount
+            self.cur.execute("""DELETE FROM update_threads WHERE strftime('%s','now') > lifetime""")
+            removed_updates = self.cur.rowcount
+        self._seen.clear()  # cheap, and the sweep runs rarely; keeps cached rows from outliving their table rows
+        self.logger.debug('Database cleanup: {} storage items older than {} and '
+                          '{} deprecated update-threads removed'.format(removed_storage, older_than_unixtime,
+                                                                        removed_updates))
+        day = time.time() // 86400
+        if day != self._last_analyze:  # once per day is plenty; keeps planner stats fresh as the tables grow
+            self._last_analyze = day
+            with self._write_lock:
+                self.cur.execute('ANALYZE')
 
     def wipe_module(self, module):
         """
@@ -569,11 +1068,14 @@ class Database:
         :param module: A string naming your plugin.
         :type module: str
         """
-        self.cur.execute("""DELETE FROM storage
-                            WHERE bot_module = (SELECT _ROWID_ FROM modules WHERE module_name = (?))""", (module,))
-        self.cur.execute("""DELETE FROM update_threads
-                            WHERE bot_module = (SELECT _ROWID_ FROM modules WHERE module_name = (?))""", (module,))
-        self.cur.execute("""DELETE FROM modules WHERE module_name = (?)""", (module,))
+        rowid = self._module_ids.pop(module, None)
+        if rowid is None:
+            return
+        self._seen.clear()
+        with self.transaction():
+            self.cur.execute("""DELETE FROM storage WHERE bot_module = (?)""", (rowid,))
+            self.cur.execute("""DELETE FROM update_threads WHERE bot_module = (?)""", (rowid,))
+            self.cur.execute("""DELETE FROM modules WHERE id = (?)""", (rowid,))
         self.logger.debug("{} got wiped from all tables and all its references.".format(module))
 
     def add_to_stats(self, id, bot_name, title, username, subreddit, permalink):
@@ -593,14 +1095,29 @@ class Database:
         :param permalink: Permalink to comment or submission the bot has responded upon
         :type permalink: str
         """
-        self.cur.execute('''INSERT INTO stats (id, bot_module, created, title, username, subreddit, permalink)
-                            VALUES ((?),
-                                   (SELECT _ROWID_ FROM modules WHERE module_name = (?)),
-                                   DATETIME('now'),
-                                   (?),
-                                   (?),
-                                   (?),
-                                   (?))''', (id, bot_name, title, username, subreddit, permalink))
+        with self._write_lock:
+            self.cur.execute('''INSERT INTO stats (id, bot_module, created, title, username, subreddit, permalink)
+                                VALUES ((?),
+                                       (?),
+                                       DATETIME('now'),
+                                       (?),
+                                       (?),
+                                       (?),
+                                       (?))''', (id, self._mid(bot_name), title, username, subreddit, permalink))
+
+    def add_many_to_stats(self, rows):
+        """
+        Adds many stats rows at once - one transaction, one prepared statement, one commit for the whole batch.
+
+        :param rows: Iterable of ``(id, bot_name, title, username, subreddit, permalink)`` tuples.
+        :type rows: iterable
+        """
+        created = time.strftime('%Y-%m-%d %H:%M:%S', time.gmtime())  # same format DATETIME('now') produces
+        resolved = [(id, self._mid(bot_name), created, title, username, subreddit, permalink)
+                    for id, bot_name, title, username, subreddit, permalink in rows]
+        self._bulk_insert('stats', ('id', 'bot_module', 'created', 'title', 'username', 'subreddit', 'permalink'),
+                          resolved)
+        self.logger.debug('Inserted a batch of {} stats rows.'.format(len(resolved)))
 
     def get_all_stats(self):
         """
@@ -609,12 +1126,42 @@ class Database:
         :return: Tuple of tuples: ``(thing_id, module_name, created, title, username, subreddit,
                  upvotes_author, upvotes_bot)``
         """
-        self.cur.execute("""SELECT id, module_name, created, title, username, subreddit,
+        self.rcur.execute("""SELECT stats.id, module_name, created, title, username, subreddit,
                                    permalink, upvotes_author, upvotes_bot
                             FROM stats
                             INNER JOIN modules
-                            ON bot_module = modules._ROWID_""")
-        return self.cur.fetchall()
+                            ON bot_module = modules.id""")
+        return self.rcur.fetchall()
+
+    def iter_stats(self):
+        """
+        Streams the stats rows instead of materializing them - same columns as ``get_all_stats``, but the rows come
+        through fetchmany batches so the full table never has to live in memory at once.
+
+        :return: Generator of tuples: ``(thing_id, module_name, created, title, username, subreddit,
+                 upvotes_author, upvotes_bot)``
+        """
+        cur = self.db_r.cursor()
+        cur.execute("""SELECT stats.id, module_name, created, title, username, subreddit,
+                              permalink, upvotes_author, upvotes_bot
+                       FROM stats
+                       INNER JOIN modules
+                       ON bot_module = modules.id""")
+        return self._fetch_in_batches(cur)
+
+    def stats_version_tag(self):
+        """
+        Cheap change marker over the tables the statistics feeder renders from. Callers can compare two tags and
+        skip re-rendering when nothing was written in between.
+
+        :return: Tuple of the newest stats rowid and the message count, buffered rows included.
+        :rtype: tuple
+        """
+        self.rcur.execute('SELECT (SELECT COALESCE(MAX(rowid), 0) FROM stats), (SELECT COUNT(*) FROM messages)')
+        stats_mark, message_count = self.rcur.fetchone()
+        # buffered messages haven't hit the table yet but must move the tag, otherwise the render that would
+        # flush them never fires for a low-traffic inbox
+        return stats_mark, message_count + len(self._message_buffer)
 
     def get_total_responses_per_day(self, timestamp):
         """
@@ -624,10 +1171,12 @@ class Database:
         :type timestamp: int | float
         :return: Tuple with ``(amount of rows,)``
         """
-        self.cur.execute('''SELECT count(*) FROM stats
-                            WHERE created BETWEEN DATE((?), 'unixepoch') AND DATE((?), 'unixepoch', '+1 day')''',
-                         (timestamp, timestamp))
-        return self.cur.fetchone()
+        day = time.strftime('%Y-%m-%d', time.gmtime(timestamp))
+        next_day = time.strftime('%Y-%m-%d', time.gmtime(timestamp + 86400))
+        self.rcur.execute('''SELECT count(*) FROM stats
+                            WHERE created BETWEEN (?) AND (?)''',
+                          (day, next_day))
+        return self.rcur.fetchone()
 
     def get_karma_loads(self):
         """
@@ -635,10 +1184,11 @@ class Database:
 
         :return: Tuple with ``(id,)``
         """
-        self.cur.execute('''SELECT id FROM stats
+        cutoff = time.strftime('%Y-%m-%d %H:%M:%S', time.gmtime(time.time() - 7 * 86400))
+        self.rcur.execute('''SELECT id FROM stats
                             WHERE upvotes_author is NULL
-                            AND created < DATETIME('now', '-7 days')''')
-        return self.cur.fetchall()
+                            AND created < (?)''', (cutoff,))
+        return self.rcur.fetchall()
 
     def update_karma_count(self, thing_id, author_upvotes, plugin_upvotes):
         """
@@ -651,9 +1201,10 @@ class Database:
         :param plugin_upvotes: Amount of upvotes from the plugin
         :type plugin_upvotes: int
         """
-        self.cur.execute('''UPDATE stats
-                            SET upvotes_author = (?), upvotes_bot = (?)
-                            WHERE id = (?)''', (author_upvotes, plugin_upvotes, thing_id))
+        with self._write_lock:
+            self.cur.execute('''UPDATE stats
+                                SET upvotes_author = (?), upvotes_bot = (?)
+                                WHERE id = (?)''', (author_upvotes, plugin_upvotes, thing_id))
 
     def update_karma_count_with_null(self, thing_id, author_upvotes):
         """
@@ -664,7 +1215,9 @@ class Database:
         :param author_upvotes: Amount of upvotes from the author
         :type author_upvotes: int
         """
-        self.cur.execute('''UPDATE stats SET upvotes_author = (?) WHERE id = (?)''', (author_upvotes, thing_id))
+        with self._write_lock:
+            self.cur.execute('''UPDATE stats SET upvotes_author = (?) WHERE id = (?)''',
+                             (author_upvotes, thing_id))
 
     def add_message(self, msg_id, bot_module, created, username, title, body):
         """
@@ -684,25 +1237,68 @@ class Database:
         :param body: Text body of this message.
         :type body: str
         """
-        self.cur.execute('''INSERT INTO messages (id, bot_module, created, title, author, body)
-                            VALUES ( (?),
-                                     (SELECT _ROWID_ FROM modules WHERE module_name = (?)),
-                                     DATETIME((?), 'unixepoch'),
-                                     (?),
-                                     (?),
-                                     (?)) ''', (msg_id, bot_module, created, username, title, body))
+        created = time.strftime('%Y-%m-%d %H:%M:%S', time.gmtime(created))
+        with self._write_lock:  # the buffer is process-shared, so appends and flushes have to serialize
+            self._message_buffer.append((msg_id, self._mid(bot_module), created, username, title, body))
+            if len(self._message_buffer) >= self._MAX_MSG_BUFFER:
+                self._flush_messages()
+
+    def flush_messages(self):
+        """
+        Flushes the shared message buffer out to the table. The update thread calls this once per cycle, so a
+        crash can only ever lose mail that arrived within the current cycle, whatever the buffer fill level.
+        """
+        self._flush_messages()
+
+    def _flush_messages(self):
+        """
+        Writes the buffered messages out in one transaction. Inbox bursts otherwise pay a commit per message.
+        """
+        with self._write_lock:  # no rows may land between the executemany and the clear
+            if not self._message_buffer:
+                return
+            with self.transaction():
+                self.cur.executemany('''INSERT INTO messages (id, bot_module, created, title, author, body)
+                                        VALUES ((?), (?), (?), (?), (?), (?))''',
+                                     self._message_buffer)
+            self._message_buffer.clear()
+
+    def iter_all_messages(self):
+        """
+        Streams the messages table - message bodies can be long, so the rows come through fetchmany batches rather
+        than one big fetchall.
+
+        :return: Generator of tuples: ``(id, module_name, created, title, author, body)``
+        """
+        self._flush_messages()  # readers should see what was just buffered
+        # _module_ids already holds every registered module, so the rowid -> name translation happens against a
+        # small dict in Python instead of joining modules into every row.
+        names = {rowid: name for name, rowid in self._module_ids.items()}
+        cur = self.db_r.cursor()
+        cur.execute('SELECT id, bot_module, created, title, author, body FROM messages')
+        for msg_id, bot_module, created, title, author, body in self._fetch_in_batches(cur):
+            yield (msg_id, names.get(bot_module), created, title, author, body)
 
     def get_all_messages(self):
         """
         Returns all messages in the messages table.
 
-        :return: Tuple of tuples: ``(id, module_name, created, title, author, body)``
+        :return: List of tuples: ``(id, module_name, created, title, author, body)``
         """
-        self.cur.execute('''SELECT id, module_name, created, title, author, body FROM messages
-                            INNER JOIN modules
-                            ON bot_module = modules._ROWID_
-                            ''')
-        return self.cur.fetchall()
+        return list(self.iter_all_messages())
+
+    @staticmethod
+    def _day_str(timestamp):
+        """
+        Formats a unix timestamp as the UTC day string the meta_stats table keys on. Doing this in Python keeps
+        the DATE(...,'unixepoch') scalar calls out of the meta statements.
+
+        :param timestamp: Unix timestamp within the day in question.
+        :type timestamp: int | float
+        :return: Day formatted as ``YYYY-MM-DD``.
+        :rtype: str
+        """
+        return time.strftime('%Y-%m-%d', time.gmtime(timestamp))
 
     def select_day_from_meta(self, timestamp):
         """
@@ -712,8 +1308,28 @@ class Database:
         :type timestamp: int | float
         :return: Tuple of ``(day, seen_submissions, seen_comment, update_cycles)``
         """
-        self.cur.execute('''SELECT * FROM meta_stats WHERE day = DATE((?), 'unixepoch')''', (timestamp,))
-        return self.cur.fetchone()
+        self.rcur.execute('SELECT * FROM meta_stats WHERE day = (?)', (self._day_str(timestamp),))
+        return self.rcur.fetchone()
+
+    def bump_meta(self, submissions=0, comments=0, cycles=0, force=False):
+        """
+        Increases the cached meta counters for this day in one go, then runs the flush check a single time. The
+        counters are incremented before the check so a flush always carries the freshest values.
+
+        :param submissions: Increases the submission count by this count.
+        :type submissions: int
+        :param comments: Increases the comment count by this count.
+        :type comments: int
+        :param cycles: Increases the update cycle count by this count.
+        :type cycles: int
+        :param force: Forces the write out into the database.
+        :type force: bool
+        """
+        self._meta_push['submissions'] += submissions
+        self._meta_push['comments'] += comments
+        self._meta_push['cycles'] += cycles
+        self._meta_total += submissions + comments + cycles
+        self.write_out_meta_push(force)
 
     def add_submission_to_meta(self, count, force=False):
         """
@@ -724,8 +1340,7 @@ class Database:
         :param force: Forces the write out into the database.
         :type force: bool
         """
-        self.write_out_meta_push(force)
-        self._meta_push['submissions'] += count
+        self.bump_meta(submissions=count, force=force)
 
     def add_comment_to_meta(self, count, force=False):
         """
@@ -736,8 +1351,7 @@ class Database:
         :param force: Forces the write out into the database.
         :type force: bool
         """
-        self.write_out_meta_push(force)
-        self._meta_push['comments'] += count
+        self.bump_meta(comments=count, force=force)
 
     def add_update_cycle_to_meta(self, count, force=False):
         """
@@ -748,21 +1362,23 @@ class Database:
         :param force: Forces the write out into the database.
         :type force: bool
         """
-        self.write_out_meta_push(force)
-        self._meta_push['cycles'] += count
+        self.bump_meta(cycles=count, force=force)
 
     def _write_out_meta_push(self):
         """
         Writes out the values in the meta cache. Reduces the amount of DB requests by a major amount.
         """
-        for k, count in self._meta_push.items():
-            if k == 'submissions':
-                self._add_submission_to_meta(count, self._date * 3600)
-            if k == 'comments':
-                self._add_comment_to_meta(count, self._date * 3600)
-            if k == 'cycles':
-                self._add_update_cycle_to_meta(count, self._date * 3600)
+        with self._write_lock:
+            self.cur.execute('''INSERT INTO meta_stats (day, seen_submissions, seen_comments, update_cycles)
+                                VALUES ((?), (?), (?), (?))
+                                ON CONFLICT(day) DO UPDATE SET
+                                    seen_submissions = seen_submissions + excluded.seen_submissions,
+                                    seen_comments = seen_comments + excluded.seen_comments,
+                                    update_cycles = update_cycles + excluded.update_cycles''',
+                             (self._day_str(self._date * 3600), self._meta_push['submissions'],
+                              self._meta_push['comments'], self._meta_push['cycles']))
         self._meta_push = {'submissions': 0, 'comments': 0, 'cycles': 0}
+        self._meta_total = 0
 
     def write_out_meta_push(self, force=False):
         """
@@ -771,59 +1387,15 @@ class Database:
         :param force: Forces the write out
         :type force: bool
         """
-        if force or sum(self._meta_push.values()) >= self._MAX_CACHE:
+        if force or self._meta_total >= self._MAX_CACHE:
             self._write_out_meta_push()
-        if not self._date == time.time() // 3600:
+        # _next_rollover is the precomputed start of the next hour, so detecting the rollover is one comparison
+        # instead of a division per bump.
+        now = time.time()
+        if now >= self._next_rollover:
             self._write_out_meta_push()
-            self._date = time.time() // 3600
-
-    def _add_submission_to_meta(self, count, timestamp):
-        """
-        Increases the submission count for a day.
-
-        :param count: Amount of which it should be increased.
-        :type count: int
-        :param timestamp: Timestamp that lies in that day it should be increased to.
-        :type timestamp: int | float
-        """
-        if not self.select_day_from_meta(timestamp):
-            self.cur.execute('''INSERT INTO meta_stats (day, seen_submissions)
-                                  VALUES (DATE((?), 'unixepoch'), (?))''', (timestamp, count))
-        else:
-            self.cur.execute('''UPDATE meta_stats SET seen_submissions = seen_submissions + (?)
-                                WHERE day = DATE((?), 'unixepoch')''', (count, timestamp))
-
-    def _add_comment_to_meta(self, count, timestamp):
-        """
-        Increases the comment count for a day.
-
-        :param count: Amount of which it should be increased.
-        :type count: int
-        :param timestamp: Timestamp that lies in that day it should be increased to.
-        :type timestamp: int | float
-        """
-        if not self.select_day_from_meta(timestamp):
-            self.cur.execute('''INSERT INTO meta_stats (day, seen_comments)
-                                  VALUES (DATE((?), 'unixepoch'), (?))'''), (timestamp, count)
-        else:
-            self.cur.execute('''UPDATE meta_stats SET seen_comments = seen_submissions + (?)
-                                WHERE day = DATE((?), 'unixepoch')''', (count, timestamp))
-
-    def _add_update_cycle_to_meta(self, count, timestamp):
-        """
-        Increases the update cycle count for a day.
-
-        :param count: Amount of which it should be increased.
-        :type count: int
-        :param timestamp: Timestamp that lies in that day it should be increased to.
-        :type timestamp: int | float
-        """
-        if not self.select_day_from_meta(timestamp):
-            self.cur.execute('''INSERT INTO meta_stats (day, update_cycles)
-                                 VALUES (DATE((?), 'unixepoch'), (?))''', (timestamp, count))
-        else:
-            self.cur.execute('''UPDATE meta_stats SET update_cycles = update_cycles + (?)
-                                WHERE day = DATE((?), 'unixepoch')''', (count, timestamp))
+            self._date = int(now // 3600)
+            self._next_rollover = (self._date + 1) * 3600
 
 
 if __name__ == "__main__":
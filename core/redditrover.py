@@ -1,22 +1,72 @@
 # coding=utf-8
+from collections import deque
 from configparser import ConfigParser
-from time import time, sleep, strptime
+from concurrent.futures import ThreadPoolExecutor
+from time import time, sleep, gmtime, monotonic
 from sys import exit
 import pkgutil
-import traceback
+import importlib
+import os
+import threading
 
-from pkg_resources import resource_filename
+from importlib.resources import files
 from praw.exceptions import *
 import praw
 
 import plugins
 from core import logprovider
 from misc import warning_filter
+from misc.fast_ini import parse_ini
 from core import *
 from .decorators import retry
 from core.stats import StatisticsFeeder
 
 
+class _SeenCache:
+    """
+    Fixed-size ring of recently seen fullnames. The praw streams re-emit items now and then, and every duplicate
+    used to pay the full responder loop; this cuts it down to one set lookup.
+
+    :ivar maxlen: How many fullnames are remembered before the oldest is evicted.
+    :vartype maxlen: int
+    :type maxlen: int
+    """
+
+    __slots__ = ('maxlen', '_ring', '_set')
+
+    def __init__(self, maxlen=4096):
+        self.maxlen = maxlen
+        self._ring = deque()
+        self._set = set()
+
+    def seen(self, name):
+        """
+        Records the fullname and reports whether it was already known.
+
+        :param name: Fullname of a submission or comment.
+        :type name: str
+        :return: True if the item came through before, False on first sight.
+        :rtype: bool
+        """
+        if name in self._set:
+            return True
+        self._set.add(name)
+        self._ring.append(name)
+        if len(self._ring) > self.maxlen:
+            self._set.discard(self._ring.popleft())
+        return False
+
+
+# Deterministic dispatch for comment_submission_action, keyed on (is_submission, is_self, has_selftext).
+# One isinstance plus a dict lookup replaces the chained isinstance/attribute checks per responder call.
+_DISPATCH = {
+    (True, True, True): 'execute_submission',
+    (True, True, False): 'execute_titlepost',
+    (True, False, False): 'execute_link',
+    (False, False, False): 'execute_comment',
+}
+
+
 class RedditRover:
     """
     Reddit Rover object is the full framework. When initing, it reads all plugins, initializes them and starts loading
@@ -28,9 +78,9 @@ class RedditRover:
     :ivar logger: Central bot logger.
     :vartype logger: Logger
     :type logger: logging.Logger
-    :ivar config: Holds a full set of configs from the configfile.
-    :vartype config: ConfigParser
-    :type config: ConfigParser
+    :ivar config: Plain dict snapshot of all sections from the configfile.
+    :vartype config: dict
+    :type config: dict
     :ivar responders: A list of plugins the bot is running. @TODO: Exit the bot if no plugin is found.
     :vartype responders: list
     :type responders: list
@@ -66,16 +116,24 @@ class RedditRover:
     :type comments: praw.helpers.comment_stream
     """
 
+    __slots__ = ('config', 'mark_as_read', 'catch_http_exception', 'delete_after', 'verbose', 'update_interval',
+                 'logger', 'multi_thread', 'lock', 'database_update', 'database_cmt', 'database_subm',
+                 'praw_handler', 'responders', '_ban_cache', '_responder_pool', '_routing', 'submission_poller',
+                 'stats', '_seen_subm', '_seen_cmt', '_last_stats_tag', '_last_cleanup', '_update_cv', '_plugin_scan', 'sub',
+                 'submissions', 'comments')
+
     def __init__(self):
         warning_filter.ignore()
-        self.config = ConfigParser()
-        self.config.read(resource_filename('config', 'bot_config.ini'))
+        self.config = parse_ini(str(files('config').joinpath('bot_config.ini')))
         self.mark_as_read, self.catch_http_exception, self.delete_after, self.verbose, self.update_interval, \
-            subreddit, generate_stats, www_path = self._bot_variables()
+            subreddit, generate_stats, www_path, replay_on_start = self._bot_variables()
         self.logger = logprovider.setup_logging(log_level=("DEBUG", "INFO")[self.verbose],
                                                 web_log_path='log.log')
         self.multi_thread = MultiThreader()
         self.lock = self.multi_thread.get_lock()
+        # lets the stream threads wake the update thread as soon as fresh work lands instead of it sleeping
+        # out the full interval
+        self._update_cv = threading.Condition(self.lock)
         self.database_update = Database()
         self.database_cmt = Database()
         self.database_subm = Database()
@@ -83,25 +141,36 @@ class RedditRover:
         try:
             self.praw_handler = RoverHandler()
             self.responders = []
+            self._plugin_scan = None
             self.load_responders()
+            self._ban_cache = self.database_update.load_all_bans()
+            # plugin calls mostly wait on reddit, so every responder can work on the same item concurrently
+            self._responder_pool = ThreadPoolExecutor(max_workers=len(self.responders),
+                                                      thread_name_prefix='responder')
             self.submission_poller = praw.Reddit(
-                user_agent=self.config.get("SUBMISSION_BOT", "description"),
-                client_id=self.config.get("SUBMISSION_BOT", "app_key"),
-                client_secret=self.config.get("SUBMISSION_BOT", "app_secret"),
-                refresh_token=self.config.get("SUBMISSION_BOT", "refresh_token")
+                user_agent=self.config['SUBMISSION_BOT']['description'],
+                client_id=self.config['SUBMISSION_BOT']['app_key'],
+                client_secret=self.config['SUBMISSION_BOT']['app_secret'],
+                refresh_token=self.config['SUBMISSION_BOT']['refresh_token']
             )
-        except Exception as e:  # I am sorry linux, but ConnectionRefused Error can't be imported.
-            self.logger.error(e)
-            self.logger.error(traceback.print_exc())
+        except Exception:  # I am sorry linux, but ConnectionRefused Error can't be imported.
+            self.logger.exception('Could not set up the praw sessions.')
             exit(-1)
         if generate_stats:  # Not everyone hosts a webserver, not everyone wants stats.
             self.stats = StatisticsFeeder(self.database_update, self.praw_handler, www_path)
         else:
             self.stats = None
 
+        self._seen_subm = _SeenCache()
+        self._seen_cmt = _SeenCache()
+        self._last_stats_tag = None
+        self._last_cleanup = 0.0
         self.sub = self.submission_poller.subreddit(subreddit)
-        self.submissions = self.sub.stream.submissions(pause_after=-1)
-        self.comments = self.sub.stream.comments(pause_after=-1)
+        # Without skip_existing the streams replay the last ~100 items on startup and every one of them walks
+        # the full responder loop again; replay_on_start keeps that available for bots that want the backlog.
+        skip = not replay_on_start
+        self.submissions = self.sub.stream.submissions(pause_after=-1, skip_existing=skip)
+        self.comments = self.sub.stream.comments(pause_after=-1, skip_existing=skip)
         self.multi_thread.go([self.comment_thread], [self.submission_thread], [self.update_thread])
         self.multi_thread.join_threads()
 
@@ -110,15 +179,18 @@ class RedditRover:
         Gets all relevant variables for this bot from the configuration
         :return: Tuple of ``(mark_as_read, catch_http_exception, delete_after, verbose, subreddit)``
         """
-        get_b = lambda x: self.config.getboolean('RedditRover', x)
-        get_i = lambda x: self.config.getint('RedditRover', x)
-        get = lambda x: self.config.get('RedditRover', x)
+        sec = self.config['RedditRover']
+        get_b = lambda x: ConfigParser.BOOLEAN_STATES[sec[x].lower()]
+        get_i = lambda x: int(sec[x])
+        # replay_on_start is newer than deployed configs (which hold credentials and are never replaced),
+        # so it has to fall back instead of raising KeyError before logging is even up
+        replay_on_start = ConfigParser.BOOLEAN_STATES[sec.get('replay_on_start', 'False').lower()]
         return get_b('mark_as_read'), get_b('catch_http_exception'), get_i('delete_after'), get_b('verbose'),\
-            get_i('update_interval'), get('subreddit'), get_b('generate_stats'), get('www_path')
+            get_i('update_interval'), sec['subreddit'], get_b('generate_stats'), sec['www_path'],\
+            replay_on_start
 
 
-    # TODO: fix this function, always returns false, breaking the program
-    def _filter_single_thing(self, thing, responder):
+    def _filter_single_thing(self, thing, responder, cached):
         """
         Helper method to filter out submissions, returns `True` or `False` depending if it hits or fails.
 
@@ -126,23 +198,30 @@ class RedditRover:
         :type thing: praw.models.reddit.comment.Comment | praw.models.reddit.submission.Submission
         :param responder: Single plugin
         :type responder: PluginBase
+        :param cached: Pre-resolved attributes of the thing, shared by all responders.
+        :type cached: dict
         """
         # noinspection PyBroadException
         try:
-            if isinstance(thing, praw.models.reddit.comment.Comment):
-                db = self.database_cmt
-            else:
-                db = self.database_subm
             b_name = responder.BOT_NAME
-            if db.retrieve_thing(thing.name, b_name):
+            # Cheap in-memory rejections first; the SQLite already-answered lookup runs only for things that
+            # survive every set check.
+            users, subs = self._ban_cache.get(b_name, ((), ()))
+            global_users, global_subs = self._ban_cache.get(None, ((), ()))
+            subreddit = cached['subreddit']
+            if subreddit is not None and (subreddit in subs or subreddit in global_subs):
                 return False
-            if hasattr(thing, 'author') and type(thing.author) is praw.models.Redditor:
-                if db.check_user_ban(thing.author.name, b_name):
+            author = cached['author']
+            if author is not None:
+                if author in users or author in global_users:
                     return False
-                if thing.author.name == responder.session.user.name and hasattr(responder, 'SELF_IGNORE') and \
-                        responder.SELF_IGNORE:
+                # integrity_check cached the lowercased account name, so no session round trip happens here
+                bot_username = getattr(responder, '_me', None)
+                if bot_username is not None and author.lower() == bot_username and \
+                        getattr(responder, 'SELF_IGNORE', False):
                     return False
-            if hasattr(thing, 'subreddit') and db.check_subreddit_ban(thing.subreddit.display_name, b_name):
+            db = self.database_cmt if cached['is_comment'] else self.database_subm
+            if db.retrieve_thing(cached['name'], b_name):
                 return False
             return True
         except Exception:
@@ -159,9 +238,18 @@ class RedditRover:
         package = plugins
         prefix = package.__name__ + "."
 
+        # The module scan hits the filesystem once per entry; remember its result keyed by the directory
+        # mtime so a reload only pays for it again when the plugin folder actually changed.
+        mtime = os.stat(package.__path__[0]).st_mtime
+        if self._plugin_scan is not None and self._plugin_scan[0] == mtime:
+            modnames = self._plugin_scan[1]
+        else:
+            modnames = [modname for importer, modname, ispkg in pkgutil.iter_modules(package.__path__, prefix)]
+            self._plugin_scan = (mtime, modnames)
+
         # we're running through all
-        for importer, modname, ispkg in pkgutil.iter_modules(package.__path__, prefix):
-            module = __import__(modname, fromlist="dummy")
+        for modname in modnames:
+            module = importlib.import_module(modname)
             # every sub module has to have an object provider,
             # this makes importing the object itself easy and predictable.
             module_object = module.init(Database(), None)
@@ -176,12 +264,22 @@ class RedditRover:
                 self.logger.info('Module "{}" is initialized and ready.'.format(module_object.__class__.__name__))
             except Exception as e:
                 # Catches _every_ error and skips the module. The import will now be reversed.
-                self.logger.error(traceback.print_exc())
-                self.logger.error("{}: {}".format(module_object.__class__.__name__, e))
+                self.logger.exception("{}: {}".format(module_object.__class__.__name__, e))
                 del module, module_object
                 continue
-            # If nothing failed, it's fine to import.
+            # If nothing failed, it's fine to import. The dispatch targets are bound once here so the hot path
+            # calls straight into the plugin method without a per-item getattr.
+            module_object._dispatch = {key: getattr(module_object, name) for key, name in _DISPATCH.items()}
             self.responders.append(module_object)
+        # Route items by subreddit where plugins declare interest; '*' collects those watching the full stream.
+        self._routing = {'*': []}
+        for responder in self.responders:
+            targets = getattr(responder, 'SUBREDDITS', None)
+            if targets:
+                for sub in targets:
+                    self._routing.setdefault(sub.lower(), []).append(responder)
+            else:
+                self._routing['*'].append(responder)
         if len(self.responders) == 0:
             self.logger.info('No plugins found and / or working, exiting RedditRover.')
             sys.exit(0)
@@ -194,7 +292,7 @@ class RedditRover:
         """
         self.logger.info("Opened submission stream successfully.")
         for subm in self.submissions:
-            if subm is not None:
+            if subm is not None and not self._seen_subm.seen(subm.name):
                 self.comment_submission_worker(subm)
                 self.database_subm.add_submission_to_meta(1)
 
@@ -205,7 +303,7 @@ class RedditRover:
         """
         self.logger.info("Opened comment stream successfully.")
         for comment in self.comments:
-            if comment is not None:
+            if comment is not None and not self._seen_cmt.seen(comment.name):
                 self.comment_submission_worker(comment)
                 self.database_cmt.add_comment_to_meta(1)
 
@@ -216,23 +314,67 @@ class RedditRover:
         :param thing: Single submission or comment
         :type thing: praw.models.reddit.comment.Comment | praw.models.reddit.submission.Submission
         """
-        for responder in self.responders:
-            # Check beforehand if a subreddit or a user is banned from the bot / globally.
-            # if self._filter_single_thing(thing, responder):
-            try:
-                self.comment_submission_action(thing, responder)
-            except PRAWException as e:
-                if self.catch_http_exception:
-                    self.logger.error('{} encountered: PRAWException - probably Reddits API.'.format(
-                        responder.BOT_NAME))
-                else:
-                    raise e
-            except Exception as e:
-                self.logger.error(traceback.print_exc())
-                self.logger.error("{} error: {} < {}".format(responder.BOT_NAME, e.__class__.__name__, e))
+        subreddit = getattr(thing, 'subreddit', None)
+        author = getattr(thing, 'author', None)
+        if isinstance(thing, praw.models.reddit.submission.Submission):
+            is_self = bool(thing.is_self)
+            kind = (True, is_self, is_self and bool(thing.selftext))
+        else:
+            kind = (False, False, False)
+        # Resolve the shared praw attributes and the dispatch kind once per item - the filter and the responded
+        # branch of every responder read the same handful of values, so N responders share one resolution pass.
+        cached = {
+            'name': thing.name,
+            'fullname': thing.fullname,
+            'author': getattr(author, 'name', None),
+            'subreddit': subreddit.display_name if subreddit is not None else None,
+            'permalink': thing.permalink,
+            'kind': kind,
+            'is_comment': not kind[0],
+        }
+        responders = self._routing['*']
+        if cached['subreddit'] is not None:
+            targeted = self._routing.get(cached['subreddit'].lower())
+            if targeted:
+                responders = responders + targeted
+        if not responders:
+            return
+        if len(responders) == 1:
+            self._guarded_action(thing, responders[0], cached)
+            return
+        futures = [self._responder_pool.submit(self._guarded_action, thing, responder, cached)
+                   for responder in responders]
+        for future in futures:  # re-raises whatever a responder was allowed to propagate
+            future.result()
+
+    def _guarded_action(self, thing, responder, cached):
+        """
+        Runs one responder against one item with the shared exception policy. Separated out so the responder
+        pool can execute it as a unit of work.
+
+        :param thing: Single submission or comment
+        :type thing: praw.models.reddit.comment.Comment | praw.models.reddit.submission.Submission
+        :param responder: Single plugin
+        :type responder: PluginBase
+        :param cached: Pre-resolved attributes of the thing, shared by all responders.
+        :type cached: dict
+        """
+        # Check beforehand if a subreddit or a user is banned from the bot / globally.
+        if not self._filter_single_thing(thing, responder, cached):
+            return
+        try:
+            self.comment_submission_action(thing, responder, cached)
+        except PRAWException as e:
+            if self.catch_http_exception:
+                self.logger.error('{} encountered: PRAWException - probably Reddits API.'.format(
+                    responder.BOT_NAME))
+            else:
+                raise e
+        except Exception as e:
+            self.logger.exception("{} error: {} < {}".format(responder.BOT_NAME, e.__class__.__name__, e))
 
     # @retry(APIException)  # when the API fails, we're here to catch that.
-    def comment_submission_action(self, thing, responder):
+    def comment_submission_action(self, thing, responder, cached):
         """
         Separated function to run a single submission or comment through a single comment.
 
@@ -240,35 +382,34 @@ class RedditRover:
         :type thing: praw.models.reddit.submission.Submission | praw.models.reddit.comment.Comment
         :param responder: single plugin
         :type responder: PluginBase
+        :param cached: Pre-resolved attributes of the thing, shared by all responders.
+        :type cached: dict
         :return:
         """
         try:
-            if isinstance(thing, praw.models.reddit.submission.Submission) and thing.is_self and thing.selftext:
-                responded = responder.execute_submission(thing)
-            elif isinstance(thing, praw.models.reddit.submission.Submission) and thing.is_self:
-                responded = responder.execute_titlepost(thing)
-            elif isinstance(thing, praw.models.reddit.submission.Submission):
-                responded = responder.execute_link(thing)
-            else:
-                responded = responder.execute_comment(thing)
+            seq = self.database_update.update_seq()
+            responded = responder._dispatch[cached['kind']](thing)
 
             if responded:
-                self.logger.debug('{} successfully responded on {}'.format(responder.BOT_NAME, thing.permalink))
-                if isinstance(thing, praw.models.reddit.comment.Comment):
-                    self.database_cmt.insert_into_storage(thing.name, responder.BOT_NAME)
-                    caredict = {'id': thing.fullname, 'bot_name': responder.BOT_NAME, 'title': thing.submission.title,
-                                'username': thing.author.name, 'subreddit': thing.subreddit.display_name,
-                                'permalink': thing.permalink}
-                    self.database_cmt.add_to_stats(**caredict)
+                # Bind everything the branch reads more than once to locals; only the title still needs a praw
+                # attribute walk, and which one depends on the item kind.
+                bot_name = responder.BOT_NAME
+                self.logger.debug('{} successfully responded on {}'.format(bot_name, cached['permalink']))
+                if cached['is_comment']:
+                    db, title = self.database_cmt, thing.submission.title
                 else:
-                    self.database_subm.insert_into_storage(thing.name, responder.BOT_NAME)
-                    caredict = {'id': thing.fullname, 'bot_name': responder.BOT_NAME, 'title': thing.title,
-                                'username': thing.author.name, 'subreddit': thing.subreddit.display_name,
-                                'permalink': thing.permalink}
-                    self.database_subm.add_to_stats(**caredict)
+                    db, title = self.database_subm, thing.title
+                db.insert_into_storage(cached['name'], bot_name)
+                db.add_to_stats(cached['fullname'], bot_name, title, cached['author'],
+                                cached['subreddit'], cached['permalink'])
+            if self.database_update.update_seq() != seq:
+                # only wake the update thread for actual update registrations, not every response
+                with self._update_cv:
+                    self._update_cv.notify()
         except Forbidden:
-            name = thing.subreddit.display_name
+            name = cached['subreddit']
             self.database_subm.add_subreddit_ban_per_module(name, responder.BOT_NAME)
+            self._ban_cache.setdefault(responder.BOT_NAME, (set(), set()))[1].add(name)  # effective immediately
             self.logger.error("{} is banned in '{}'. Auto banned".format(responder.BOT_NAME, name))
         except NotFound:
             pass
@@ -287,14 +428,20 @@ class RedditRover:
         First it loads all threads that have to update and executes the update_procedure of your plugin.
         Then it loads all unread messages of your plugin, cleans up the database and sleeps for 5 minutes.
         """
+        next_cycle = monotonic()
         while True:
-            self.lock.acquire(True)
+            # The plugin update loops and message polling spend most of their time waiting on reddit, so they
+            # run without the shared lock; only the database maintenance at the end of the cycle takes it.
+            # Due update rows are serviced on every wake; inbox polling, stats and maintenance stay on the
+            # fixed cadence, so an early wake never costs a reddit API call per plugin.
+            full_cycle = monotonic() >= next_cycle
+            grouped = self.database_update.get_all_updates_grouped()
             for responder in self.responders:
-                threads = self.database_update.get_all_to_update(responder.BOT_NAME)
                 try:
-                    for thread in threads:
+                    for thread in grouped.get(responder.BOT_NAME, ()):
                         self.update_action(thread, responder)
-                    responder.get_unread_messages(self.mark_as_read)
+                    if full_cycle and getattr(responder, 'HAS_INBOX_HANDLER', True):
+                        responder.get_unread_messages(self.mark_as_read)
                 except PRAWException as e:
                     if self.catch_http_exception:
                         self.logger.error('{} encountered: PRAWException - probably Reddits API.'.format(
@@ -302,21 +449,47 @@ class RedditRover:
                     else:
                         raise e
                 except Exception as e:
-                    self.logger.error(traceback.print_exc())
-                    self.logger.error("{} error: {} < {}".format(responder.BOT_NAME, e.__class__.__name__, e))
-            if self.stats:
-                try:
-                    self.stats.get_old_comment_karma()
-                    self.stats.render_overview()
-                    self.stats.render_karma()
-                    self.stats.render_messages()
-                except:
-                    pass
-            self.database_update.clean_up_database(int(time()) - int(self.delete_after))
-            self.database_update.add_update_cycle_to_meta(1)
-            self.lock.release()
-            # after working through all update threads, sleep for five minutes. #saveresources
-            sleep(self.update_interval)
+                    self.logger.exception("{} error: {} < {}".format(responder.BOT_NAME, e.__class__.__name__, e))
+            if full_cycle:
+                if self.stats:
+                    # only re-render when the underlying tables moved since the last cycle
+                    stats_tag = self.database_update.stats_version_tag()
+                    if stats_tag != self._last_stats_tag:
+                        try:
+                            self.stats.get_old_comment_karma()
+                            self.stats.render_all()
+                            self._last_stats_tag = stats_tag
+                        except:
+                            pass
+                now = time()
+                with self.lock:
+                    # rows only age out slowly against a retention window of days, so sweeping the database a
+                    # handful of times per window instead of every cycle deletes the exact same rows
+                    if now - self._last_cleanup >= self.delete_after / 10:
+                        self.database_update.clean_up_database(int(now) - self.delete_after)
+                        self._last_cleanup = now
+                    # bans may have been lifted or added outside the process, refresh the snapshot once per cycle
+                    self._ban_cache = self.database_update.load_all_bans()
+                    self.database_update.add_update_cycle_to_meta(1)
+                    # messages were already marked read on reddit, so buffered rows must reach disk every cycle
+                    self.database_update.flush_messages()
+                # advance towards a fixed deadline so the cycle period doesn't drift by however long the work
+                # took; early wakes leave the cadence untouched
+                next_cycle = max(next_cycle + self.update_interval, monotonic())
+            # sleep until the cadence deadline, or the earliest due update row if that comes first; a notify
+            # after a fresh registration recomputes the target so the new row gets serviced on time. The
+            # floor keeps a row that stays overdue (its update just failed) on a short backoff instead of a
+            # hot loop.
+            with self._update_cv:
+                while True:
+                    target = next_cycle
+                    due = self.database_update.next_update_due()
+                    if due is not None:
+                        target = min(target, monotonic() + max(5.0, due - time()))
+                    remaining = target - monotonic()
+                    if remaining <= 0:
+                        break
+                    self._update_cv.wait(timeout=remaining)
 
     @retry(APIException)  # when the API bugs out, we retry it for a while, this thread has time for it anyway.
     def update_action(self, thread, responder):
@@ -329,7 +502,7 @@ class RedditRover:
         :type responder: PluginBase
         """
         # reformat the entry from the database, so we can feed it directly into the update_procedure
-        time_strip = lambda x: strptime(x, '%Y-%m-%d %H:%M:%S')
+        time_strip = lambda x: gmtime(x)  # the database stores unix timestamps, plugins expect struct_time
         self.database_update.update_timestamp_in_update(thread[0], responder.BOT_NAME)
         # Accessing the thread_info from the responder _could_ be unsafe, but it's immensely faster.
         responder.update_procedure(thing=responder.session.get_info(thing_id=thread[0]),
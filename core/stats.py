@@ -98,15 +98,31 @@ class StatisticsFeeder:
             thread_id = thread[0]
             self.db.update_karma_count(thread_id, randint(-50, 350), randint(-50, 350))
 
-    def render_overview(self):
+    def render_all(self):
+        """Renders every overview, karma and message file from one shared stats fetch. The individual
+        renderers each pulled their own full copy of the stats table, so one update cycle paid six identical
+        queries for the same rowset."""
         self.status_online()
-        self._table_rows()
-        self._plugin_activity()
-        self._subreddit_activity()
-        self._post_histogram()
+        dataset = self.db.get_all_stats()
+        self._table_rows(dataset)
+        self._plugin_activity(dataset)
+        self._subreddit_activity(dataset)
+        self._post_histogram(dataset)
+        self._total_karma(dataset)
+        self._average_karma(dataset)
+        self._message_rows()
 
-    def _table_rows(self):
+    def render_overview(self):
+        self.status_online()
         dataset = self.db.get_all_stats()
+        self._table_rows(dataset)
+        self._plugin_activity(dataset)
+        self._subreddit_activity(dataset)
+        self._post_histogram(dataset)
+
+    def _table_rows(self, dataset=None):
+        if dataset is None:
+            dataset = self.db.get_all_stats()
         carelist = []
         title = '<a href="{url}" target="_blank" class="text-primary"> {text} </a>'
         subreddit = '<a href="http://reddit.com/r/{sub}" target="_blank" class="text-warning"> {sub} </a>'
@@ -128,8 +144,9 @@ class StatisticsFeeder:
         with open(self.path + '_data/overview_rows.json', 'w') as f:
             f.write(json.dumps(carelist))
 
-    def _plugin_activity(self):
-        dataset = self.db.get_all_stats()
+    def _plugin_activity(self, dataset=None):
+        if dataset is None:
+            dataset = self.db.get_all_stats()
         chart_data = {}
         for line in dataset:
             if line[1] in chart_data:
@@ -142,10 +159,11 @@ class StatisticsFeeder:
         with open(self.path + '_data/post_list.json', 'w') as f:
             f.write(json.dumps(carelist))
 
-    def _subreddit_activity(self):
+    def _subreddit_activity(self, dataset=None):
         def tighten_filter(list, min_submissions):
             return [dict for dict in list if dict['data'] > min_submissions]
-        dataset = self.db.get_all_stats()
+        if dataset is None:
+            dataset = self.db.get_all_stats()
         carelist = []
         subreddit_data = {}
         for line in dataset:
@@ -163,8 +181,9 @@ class StatisticsFeeder:
         with open(self.path + '_data/subreddit_data.json', 'w') as f:
             f.write(json.dumps(carelist))
 
-    def _post_histogram(self):
-        dataset = self.db.get_all_stats()
+    def _post_histogram(self, dataset=None):
+        if dataset is None:
+            dataset = self.db.get_all_stats()
         carelist = []
         date_change_dataset = [[line[1], datetime.datetime.strptime(line[2], "%Y-%m-%d %H:%M:%S")] for line in dataset]
         post_history = {}
@@ -197,11 +216,13 @@ class StatisticsFeeder:
             f.write(json.dumps(carelist))
 
     def render_karma(self):
-        self._total_karma()
-        self._average_karma()
-
-    def _total_karma(self):
         dataset = self.db.get_all_stats()
+        self._total_karma(dataset)
+        self._average_karma(dataset)
+
+    def _total_karma(self, dataset=None):
+        if dataset is None:
+            dataset = self.db.get_all_stats()
         caredict = {}
         carelist = []
         for line in dataset:
@@ -218,8 +239,9 @@ class StatisticsFeeder:
         with open(self.path + '_data/total_karma.json', 'w+') as f:
             f.write(json.dumps(carelist))
 
-    def _average_karma(self):
-        dataset = self.db.get_all_stats()
+    def _average_karma(self, dataset=None):
+        if dataset is None:
+            dataset = self.db.get_all_stats()
         caredict = {}
         carelist = []
         for line in dataset:
@@ -0,0 +1,32 @@
+# coding=utf-8
+import re
+
+_SECTION = re.compile(r'^\[([^\]]+)\]\s*$')
+_OPTION = re.compile(r'^\s*([^=;#\s][^=]*?)\s*=\s*(.*?)\s*$')
+
+
+def parse_ini(path):
+    """
+    Minimal ini reader for the bot configuration. Scans the file line by line with two regexes instead of going
+    through ConfigParser, which pays for interpolation and option transformation we never use. Option names are
+    lowercased like ConfigParser does; continuation lines and ``%(...)s`` interpolation are not supported.
+
+    :param path: Path to the ini file.
+    :type path: str
+    :return: Mapping of section name onto a dict of its options.
+    :rtype: dict
+    """
+    sections = {}
+    current = None
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            if line.lstrip().startswith((';', '#')):
+                continue
+            match = _SECTION.match(line)
+            if match:
+                current = sections.setdefault(match.group(1), {})
+                continue
+            match = _OPTION.match(line)
+            if match and current is not None:
+                current[match.group(1).lower()] = match.group(2)
+    return sections